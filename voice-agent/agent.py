@@ -24,6 +24,9 @@ from livekit.plugins import (
 )
 
 from tools import AssistantFnc
+from loop_monitor import LoopMonitor
+from speculative import SpeculativeReplyGate
+from endpointing import AdaptiveEndpointing, MAX_ENDPOINTING_DELAY, MIN_ENDPOINTING_DELAY
 
 
 load_dotenv(dotenv_path=".env.local")
@@ -52,12 +55,16 @@ logger.addHandler(console_handler)
 # これにより既存のロガー設定をリセットする（オプション）
 logger.propagate = False
 
-
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
 
 
 async def entrypoint(ctx: JobContext):
+    # イベントループの遅延監視を開始（ジョブ終了時に統計を出力）
+    loop_monitor = LoopMonitor(room_name=ctx.job.room.name, output_dir=log_dir)
+    loop_monitor.start()
+    ctx.add_shutdown_callback(loop_monitor.aclose)
+
     initial_ctx = llm.ChatContext().append(
         role="system",
         text=(
@@ -83,6 +90,30 @@ async def entrypoint(ctx: JobContext):
     # AssistantFncのインスタンスを作成
     fnc_ctx = AssistantFnc()
 
+    # use LiveKit's transformer-based turn detector
+    # IDの読み上げ途中では発話終了の判定を遅らせ、IDや確認の応答が揃ったら早める
+    eou_model = AdaptiveEndpointing(turn_detector.EOUModel())
+
+    # 投機的生成（SPECULATIVE_REPLY=1で有効化）
+    # EOUの確定を待たずにSTTの確定文字起こしの時点でLLMとTTSを開始し、
+    # ユーザーが話し続けた場合はパイプラインが応答を破棄する
+    # ゲートは確定文字起こしごとにパイプラインとは別にEOU推論を一回行い、
+    # パイプラインがmax_endpointing_delayだけ待つ発話（確率がunlikely_threshold未満）でのみ開始を遅らせる
+    speculation_gate = None
+    speculative_opts = {}
+    if os.environ.get("SPECULATIVE_REPLY") == "1":
+        speculate_threshold = os.environ.get("SPECULATIVE_EOU_THRESHOLD")
+        speculation_gate = SpeculativeReplyGate(
+            predict_eou=eou_model.estimate_end_of_turn,
+            unlikely_threshold=eou_model.unlikely_threshold(),
+            speculate_threshold=float(speculate_threshold) if speculate_threshold else None,
+            hold_delay=MAX_ENDPOINTING_DELAY,
+        )
+        speculative_opts = {
+            "preemptive_synthesis": True,
+            "before_llm_cb": speculation_gate.before_llm_cb,
+        }
+
     # This project is configured to use Deepgram STT, OpenAI LLM and Cartesia TTS plugins
     # Other great providers exist like Cerebras, ElevenLabs, Groq, Play.ht, Rime, and more
     # Learn more and pick the best one for your app:
@@ -98,17 +129,15 @@ async def entrypoint(ctx: JobContext):
             model="gpt-4o-mini-tts",
             instructions="あなたは注文確認のコールセンターのエージェントです。注文の確認・変更・キャンセルを司ります。注文番号(order_id)とユーザー番号(user_id)はともに5桁の数字になります。それらの数字は一文字ずつ読み上げてください。例：01135 -> ぜろ いち いち さん ご。注文番号とユーザー番号は、必ず5桁全てを読み上げてください。これらの番号は会話において非常に重要なため、特に明瞭に発音してください。",
             ),
-        # use LiveKit's transformer-based turn detector
-        turn_detector=turn_detector.EOUModel(),
-        # minimum delay for endpointing, used when turn detector believes the user is done with their turn
-        min_endpointing_delay=0.5,
-        # maximum delay for endpointing, used when turn detector does not believe the user is done with their turn
-        max_endpointing_delay=5.0,
+        turn_detector=eou_model,
+        min_endpointing_delay=MIN_ENDPOINTING_DELAY,
+        max_endpointing_delay=MAX_ENDPOINTING_DELAY,
         # enable background voice & noise cancellation, powered by Krisp
         # included at no additional cost with LiveKit Cloud
         noise_cancellation=noise_cancellation.BVC(),
         chat_ctx=initial_ctx,
         fnc_ctx=fnc_ctx,
+        **speculative_opts,
     )
 
     usage_collector = metrics.UsageCollector()
@@ -117,6 +146,39 @@ async def entrypoint(ctx: JobContext):
     def on_metrics_collected(agent_metrics: metrics.AgentMetrics):
         metrics.log_metrics(agent_metrics)
         usage_collector.collect(agent_metrics)
+        if speculation_gate is not None and isinstance(agent_metrics, metrics.LLMMetrics):
+            speculation_gate.on_llm_metrics(
+                agent_metrics.prompt_tokens, agent_metrics.completion_tokens, cancelled=agent_metrics.cancelled
+            )
+
+    @agent.on("agent_speech_committed")
+    def on_agent_speech_committed(msg: llm.ChatMessage):
+        eou_model.on_agent_speech_committed(msg.content)
+
+    async def log_endpointing_stats():
+        logger.info(f"エンドポイント調整の統計: {eou_model.stats()}")
+
+    ctx.add_shutdown_callback(log_endpointing_stats)
+
+    if speculation_gate is not None:
+
+        @agent.on("user_stopped_speaking")
+        def on_user_stopped_speaking():
+            speculation_gate.on_user_stopped_speaking()
+
+        @agent.on("user_speech_committed")
+        def on_user_speech_committed(msg: llm.ChatMessage):
+            speculation_gate.on_user_speech_committed(msg.content)
+
+        async def log_speculation_stats():
+            logger.info(f"投機的生成の統計: {speculation_gate.stats.snapshot()}")
+
+        ctx.add_shutdown_callback(log_speculation_stats)
+
+    async def log_backend_metrics():
+        logger.info(f"バックエンド呼び出し統計: {fnc_ctx.order_client.metrics.snapshot()}")
+
+    ctx.add_shutdown_callback(log_backend_metrics)
 
     agent.start(ctx.room, participant)
 
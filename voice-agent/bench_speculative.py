@@ -0,0 +1,132 @@
+"""
+投機的生成による体感応答時間の変化をスタブで計測するベンチマーク。
+
+ユーザーの発話終了から、エージェントの最初の音声が用意できるまでの時間を
+通常の処理（EOU確定後にLLMを開始）と投機的生成とで比較する。
+投機的生成ではゲートが確定文字起こしごとにEOU推論を追加で行うため、
+推論回数も併せて出力する。推論は一つの実行環境を共有するものとして直列に実行する。
+
+    python bench_speculative.py
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from endpointing import MAX_ENDPOINTING_DELAY, MIN_ENDPOINTING_DELAY
+from speculative import SpeculativeReplyGate
+
+# 実時間を短縮するための倍率（表示は元の時間に戻す）
+SCALE = 0.1
+
+# 各処理にかかる時間（秒）
+STT_DELAY = 0.3            # 発話区間の終了から文字起こし確定まで
+EOU_INFERENCE = 0.05       # ターン検出モデルの推論（一回あたり）
+UNLIKELY_THRESHOLD = 0.0289  # turn_detector.EOUModelのデフォルト。これ未満はMAX_ENDPOINTING_DELAYだけ待つ
+NEXT_SEGMENT_GAP = 0.6     # 言い淀み後、次の発話区間が始まるまで
+LLM_TTFT = 0.6
+TTS_FIRST_AUDIO = 0.25
+
+# LLM呼び出し1回あたりのトークン数（破棄時の推定に使う）
+PROMPT_TOKENS = 1200
+COMPLETION_TOKENS = 40
+
+# シナリオごとの発話区間（文字起こし, EOU確率）
+SCENARIOS = [
+    ("一息で発話", [("ユーザー番号は12345で注文番号は67890です", 0.9)]),
+    ("途中で区切る発話", [("注文番号は", 0.02), ("注文番号は 67890です", 0.8)]),
+    ("言い淀み", [("えっと", 0.1), ("えっと キャンセルしたいです", 0.95)]),
+    ("確信度が中程度", [("はい", 0.1)]),
+    # パイプラインもゲートもMAX_ENDPOINTING_DELAYだけ待つ（保留しても通常より遅くならない）
+    ("IDの途中で沈黙", [("注文番号は123", 0.0)]),
+]
+
+
+class StubStream:
+    async def first_audio(self):
+        await asyncio.sleep((LLM_TTFT + TTS_FIRST_AUDIO) * SCALE)
+
+
+async def run_scenario(segments, speculative):
+    probabilities = dict(segments)
+    # パイプラインとゲートの推論は同じ実行環境を共有する
+    inference_lock = asyncio.Lock()
+    inferences = 0
+
+    async def predict_eou(chat_ctx):
+        nonlocal inferences
+        async with inference_lock:
+            await asyncio.sleep(EOU_INFERENCE * SCALE)
+            inferences += 1
+        return probabilities[chat_ctx.messages[-1].content]
+
+    gate = SpeculativeReplyGate(
+        predict_eou=predict_eou,
+        unlikely_threshold=UNLIKELY_THRESHOLD,
+        hold_delay=MAX_ENDPOINTING_DELAY * SCALE,
+    )
+    agent = SimpleNamespace(llm=SimpleNamespace(chat=lambda chat_ctx, fnc_ctx: StubStream()), fnc_ctx=None)
+
+    async def speculate(text):
+        chat_ctx = SimpleNamespace(messages=[SimpleNamespace(role="user", content=text)])
+        stream = await gate.before_llm_cb(agent, chat_ctx)
+        gate.on_llm_metrics(PROMPT_TOKENS, COMPLETION_TOKENS)
+        await stream.first_audio()
+
+    for i, (text, probability) in enumerate(segments):
+        speech_end = time.monotonic()
+        gate.on_user_stopped_speaking()
+        await asyncio.sleep(STT_DELAY * SCALE)
+
+        task = asyncio.create_task(speculate(text)) if speculative else None
+        await asyncio.sleep(0)
+
+        # パイプライン自身も確定文字起こしごとにEOU推論を行う
+        chat_ctx = SimpleNamespace(messages=[SimpleNamespace(role="user", content=text)])
+        pipeline_inference = asyncio.create_task(predict_eou(chat_ctx))
+
+        if i < len(segments) - 1:
+            # ユーザーが話し続けたため、投機した応答はパイプラインによって破棄される
+            await asyncio.sleep(NEXT_SEGMENT_GAP * SCALE)
+            if task is not None:
+                task.cancel()
+            continue
+
+        # パイプラインによるEOUの確定
+        await pipeline_inference
+        delay = MIN_ENDPOINTING_DELAY if probability >= UNLIKELY_THRESHOLD else MAX_ENDPOINTING_DELAY
+        await asyncio.sleep(delay * SCALE)
+
+        if task is not None:
+            await task
+        else:
+            await StubStream().first_audio()
+
+        gate.on_user_speech_committed(text)
+        return (time.monotonic() - speech_end) / SCALE, inferences, gate.stats
+
+
+async def main():
+    print(f"{'シナリオ':<16}{'通常(ms)':>10}{'投機(ms)':>10}{'短縮(ms)':>10}{'EOU推論(通常/投機)':>20}")
+    total = None
+    for name, segments in SCENARIOS:
+        baseline, baseline_inferences, _ = await run_scenario(segments, speculative=False)
+        speculative, speculative_inferences, stats = await run_scenario(segments, speculative=True)
+        print(
+            f"{name:<16}{baseline * 1000:>10.0f}{speculative * 1000:>10.0f}{(baseline - speculative) * 1000:>10.0f}"
+            f"{f'{baseline_inferences}/{speculative_inferences}':>20}"
+        )
+
+        if total is None:
+            total = stats
+        else:
+            total.started += stats.started
+            total.hits += stats.hits
+            total.misses += stats.misses
+            total.held += stats.held
+            total.wasted_tokens += stats.wasted_tokens
+
+    print(f"投機的生成の統計: {total.snapshot()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from order_backend import OrderBackend
+
+
+class FaultyBackend(OrderBackend):
+    """
+    遅延や例外を注入できるテスト用のバックエンド。
+    delaysとfailuresには呼び出し順に適用する値を並べる（尽きたら遅延なし・成功）。
+    """
+
+    def __init__(self, delays=None, failures=None):
+        super().__init__()
+        self.delays = list(delays or [])
+        self.failures = list(failures or [])
+        self.calls = 0
+
+    async def _inject_fault(self):
+        self.calls += 1
+        delay = self.delays.pop(0) if self.delays else 0.0
+        fail = self.failures.pop(0) if self.failures else False
+        await asyncio.sleep(delay)
+        if fail:
+            raise ConnectionError("backend unavailable")
+
+    async def get_order(self, user_id, order_id):
+        await self._inject_fault()
+        return await super().get_order(user_id, order_id)
+
+    async def cancel_order(self, user_id, order_id):
+        await self._inject_fault()
+        return await super().cancel_order(user_id, order_id)
+
+
+@pytest.fixture
+def faulty_backend():
+    """FaultyBackendを生成するファクトリ"""
+    return FaultyBackend
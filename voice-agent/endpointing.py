@@ -0,0 +1,172 @@
+import logging
+import re
+import unicodedata
+
+# ハンドラーの設定はagent.pyで行われるため、ここではロガーの取得のみ
+logger = logging.getLogger("voice-agent")
+
+# minimum delay for endpointing, used when turn detector believes the user is done with their turn
+MIN_ENDPOINTING_DELAY = 0.5
+# maximum delay for endpointing, used when turn detector does not believe the user is done with their turn
+MAX_ENDPOINTING_DELAY = 5.0
+
+# 注文番号(order_id)とユーザー番号(user_id)の桁数
+ID_DIGITS = 5
+
+# 数字として扱う漢数字
+KANJI_DIGITS = str.maketrans("〇零一二三四五六七八九", "00123456789")
+
+# 数字の間に入りうる区切り文字（読み上げ時の間や文字起こしの揺れ）
+DIGIT_RUN_PATTERN = re.compile(r"\d(?:[\s,、・\-ー]*\d)*")
+
+# 末尾から取り除く句読点
+TRAILING_PUNCTUATION = "。、，,.！!？?　 "
+
+# はい・いいえの確認とみなす発話
+CONFIRMATION_PATTERN = re.compile(
+    r"^((はい|いいえ|ええ|うん|いや|そうです|違います|ちがいます|合ってます|あってます|大丈夫です|お願いします)(です|ね|よ|、|。)*)+$"
+)
+
+# IDの直後に続いても発話が完結しているとみなす語
+ID_SUFFIX_PATTERN = re.compile(r"^(です|になります|だよ|ね|よ)?$")
+
+# このターン検出器が対応する言語（STTのlanguageの先頭部分）
+SUPPORTED_LANGUAGES = ("ja", "japanese")
+
+# IDに言及しているとみなす語（エージェントの質問、ユーザーの発話の両方に使う）
+ID_MENTION_PATTERN = re.compile(r"番号|ID", re.IGNORECASE)
+
+# 番号が聞き取れず、再度の発話をお願いしたとみなすエージェントの発話
+REASK_PATTERN = re.compile(
+    r"聞き取れ|聞こえませんでした|(番号|数字|ID)[^。]*(もう一度|もう1度)|(もう一度|もう1度)[^。]*(番号|数字|ID)"
+)
+
+
+class AdaptiveEndpointing:
+    """
+    ユーザーが5桁のIDを読み上げている途中かどうかに応じて、発話終了の判定を調整するターン検出器。
+
+    VoicePipelineAgentは、ターン検出器が返す確率がunlikely_thresholdを下回ると
+    max_endpointing_delay、それ以外ではmin_endpointing_delayだけ待ってから応答する。
+    直前にエージェントが番号を尋ねたか、ユーザーが番号に言及しており、
+    5桁に満たない数字で発話が終わっている場合は確率を0にして待機時間を延ばす。
+    5桁のIDやはい・いいえの確認で終わっている場合は確率を1にして待機時間を縮める。
+    それ以外（数量の回答など）はラップしたターン検出モデルの判定をそのまま使う。
+
+    パイプラインはsupports_languageがTrueを返した場合のみpredict_end_of_turnを呼ぶ。
+    ラップするturn_detector.EOUModelは英語にしか対応していないため、日本語にも対応すると返し、
+    モデルが対応しない言語ではモデルの代わりに確率1（min_endpointing_delay）を返す。
+    """
+
+    def __init__(self, model):
+        # ラップするターン検出モデル（turn_detector.EOUModel）
+        self.model = model
+
+        # 待機時間を延ばした回数
+        self.extended_count = 0
+        # 待機時間を縮めた回数
+        self.shortened_count = 0
+        # エージェントが聞き返した回数
+        self.reask_count = 0
+        # 直近の確定文字起こしの言語（パイプラインがsupports_languageに渡す）
+        self._language = None
+
+    def __getattr__(self, name):
+        # unlikely_thresholdやsupports_languageなどはラップしたモデルに委譲する
+        return getattr(self.model, name)
+
+    def supports_language(self, language):
+        """パイプラインから確定文字起こしの言語を受け取り、このターン検出器を使うかを返す"""
+        self._language = language
+        if language is not None and language.lower().split("-")[0] in SUPPORTED_LANGUAGES:
+            return True
+        return self.model.supports_language(language)
+
+    def classify(self, chat_ctx):
+        """直前のエージェントの質問とユーザーの発話から、会話の状態を返す（集計はしない）"""
+        messages = chat_ctx.messages
+        if not messages:
+            return "other"
+
+        # 直前のエージェントの発話の最後の文が番号を尋ねていたか
+        # （「注文番号は12345ですね。何個に変更しますか」は数量を尋ねている）
+        expecting_id = False
+        for message in reversed(messages[:-1]):
+            if message.role == "assistant":
+                if isinstance(message.content, str):
+                    sentences = [s for s in re.split(r"[。？?！!]", message.content) if s.strip()]
+                    expecting_id = bool(sentences) and bool(ID_MENTION_PATTERN.search(sentences[-1]))
+                break
+
+        text = messages[-1].content if isinstance(messages[-1].content, str) else ""
+        return classify_transcript(text, expecting_id=expecting_id)
+
+    async def estimate_end_of_turn(self, chat_ctx):
+        """発話終了の確率を返す（集計はしない。投機的生成のゲートなどから使う）"""
+        return await self._probability(self.classify(chat_ctx), chat_ctx)
+
+    async def predict_end_of_turn(self, chat_ctx):
+        """パイプラインから呼ばれ、発話終了の確率を返す"""
+        state = self.classify(chat_ctx)
+        if state == "partial_id":
+            self.extended_count += 1
+            logger.debug(f"IDの読み上げ途中のため発話終了の判定を遅らせます: {chat_ctx.messages[-1].content}")
+        elif state in ("complete_id", "confirmation"):
+            self.shortened_count += 1
+        return await self._probability(state, chat_ctx)
+
+    async def _probability(self, state, chat_ctx):
+        if state == "partial_id":
+            return 0.0
+        if state in ("complete_id", "confirmation"):
+            return 1.0
+        if not self.model.supports_language(self._language):
+            # モデルが対応しない言語では、これまでどおりmin_endpointing_delayで応答する
+            return 1.0
+        return await self.model.predict_end_of_turn(chat_ctx)
+
+    def on_agent_speech_committed(self, text):
+        """エージェントの発話がチャットコンテキストに確定したときに呼び出す"""
+        if REASK_PATTERN.search(text):
+            self.reask_count += 1
+
+    def stats(self):
+        """集計結果を辞書で返す"""
+        return {
+            "extended": self.extended_count,
+            "shortened": self.shortened_count,
+            "reasks": self.reask_count
+        }
+
+
+def classify_transcript(text, expecting_id=False):
+    """
+    ユーザー発話の文字起こしを分類する。
+    partial_id: 5桁に満たない数字で終わっており、番号を尋ねられたか、直前の数字との間で
+                番号に言及している（読み上げの途中）
+    complete_id: 5桁（の倍数）の数字で終わっている（「です」などが続く場合を含む）
+    confirmation: はい・いいえの確認
+    other: それ以外
+    """
+    normalized = unicodedata.normalize("NFKC", text).translate(KANJI_DIGITS).rstrip(TRAILING_PUNCTUATION)
+
+    if CONFIRMATION_PATTERN.match(normalized.replace(" ", "")):
+        return "confirmation"
+
+    runs = list(DIGIT_RUN_PATTERN.finditer(normalized))
+    if not runs:
+        return "other"
+
+    last_run = runs[-1]
+    digit_count = sum(ch.isdigit() for ch in last_run.group())
+    remainder = normalized[last_run.end():].strip()
+    if digit_count % ID_DIGITS == 0:
+        if ID_SUFFIX_PATTERN.match(remainder):
+            return "complete_id"
+        return "other"
+    # 言い終えたIDの後に続く数量を読み上げ途中と誤らないよう、直前の数字以降の言及だけを見る
+    context_start = runs[-2].end() if len(runs) > 1 else 0
+    context = normalized[context_start:last_run.start()]
+    if not remainder and (expecting_id or ID_MENTION_PATTERN.search(context)):
+        return "partial_id"
+    return "other"
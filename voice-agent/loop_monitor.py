@@ -0,0 +1,292 @@
+import asyncio
+import collections
+import datetime
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import traceback
+
+# ハンドラーの設定はagent.pyで行われるため、ここではロガーの取得のみ
+logger = logging.getLogger("voice-agent")
+
+
+class LoopLagWatchdog:
+    """
+    イベントループの遅延(lag)を常時計測し、閾値を超えてループをブロックしている
+    コルーチンやコールバックのスタックを記録する。
+    """
+
+    def __init__(self, interval=0.1, threshold=0.2):
+        # 計測間隔（秒）
+        self.interval = interval
+        # ブロックとみなす閾値（秒）
+        self.threshold = threshold
+
+        self.ticks = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.stall_count = 0
+        # 直近のブロック情報（ブロック時間とスタック）
+        self.stalls = collections.deque(maxlen=20)
+
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._last_tick = 0.0
+        # 検知したがまだ解消していないブロック（検知時のtick, 記録）
+        self._open_stall = None
+
+    def start(self):
+        """イベントループのスレッドから呼び出して監視を開始する"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop_event.clear()
+
+        self._task = self._loop.create_task(self._tick_loop())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    async def aclose(self):
+        """監視を停止する"""
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    async def _tick_loop(self):
+        # 指定間隔でスリープし、予定時刻からの遅れをループの遅延として記録する
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+
+            self.ticks += 1
+            self.total_lag += lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            previous_tick = self._last_tick
+            self._last_tick = now
+
+            # 検知時点のブロック時間は閾値程度のため、ループが再開した時点の遅れで記録を更新する
+            open_stall = self._open_stall
+            if open_stall is not None and open_stall[0] == previous_tick:
+                self._open_stall = None
+                stall = open_stall[1]
+                stall["blocked_ms"] = round(lag * 1000, 1)
+                logger.warning(f"イベントループのブロックが解消しました: {lag * 1000:.0f}ms (task={stall['task']})")
+
+    def _watch(self):
+        # 別スレッドからループの進行を監視し、止まっている間にスタックを取得する
+        reported_tick = None
+        while not self._stop_event.wait(self.interval / 2):
+            last_tick = self._last_tick
+            # 次のtickが起きるはずだった時刻からの遅れをブロック時間とする
+            blocked = time.monotonic() - (last_tick + self.interval)
+            # 同じブロックについては一度だけ記録する
+            if blocked >= self.threshold and reported_tick != last_tick:
+                reported_tick = last_tick
+                self._report_stall(blocked, last_tick)
+
+    def _report_stall(self, blocked, last_tick):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+
+        task = asyncio.current_task(self._loop)
+        task_name = task.get_name() if task is not None else None
+
+        stall = {
+            "blocked_ms": round(blocked * 1000, 1),
+            "task": task_name,
+            "stack": stack,
+            "timestamp": datetime.datetime.now().isoformat()
+        }
+        self.stall_count += 1
+        self.stalls.append(stall)
+        self._open_stall = (last_tick, stall)
+        logger.warning(
+            f"イベントループが{blocked * 1000:.0f}ms以上ブロックされています (task={task_name})\n{stack}"
+        )
+
+    def stats(self):
+        """計測結果を辞書で返す"""
+        return {
+            "ticks": self.ticks,
+            "avg_lag_ms": round(self.total_lag / self.ticks * 1000, 2) if self.ticks else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "stall_count": self.stall_count
+        }
+
+
+class SamplingProfiler:
+    """
+    イベントループのスレッドを一定間隔でサンプリングし、
+    flamegraph互換のcollapsed stack形式で出力するプロファイラ。
+    """
+
+    def __init__(self, tag, interval=0.005):
+        # 出力ファイルに付与するタグ（ルーム名など）
+        self.tag = tag
+        # サンプリング間隔（秒）
+        self.interval = interval
+        # 折りたたんだスタック文字列 -> サンプル数
+        self.samples = collections.Counter()
+
+        self._thread_id = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, thread_id=None):
+        """プロファイル対象のスレッドから呼び出すか、対象のスレッドIDを指定して開始する"""
+        if self.running:
+            return
+        self._thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """サンプリングを停止する"""
+        if not self.running:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.samples[self._fold(frame)] += 1
+
+    @staticmethod
+    def _fold(frame):
+        # ルートから順に「関数名 (ファイル名:行番号)」を;で連結する
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            names.append(name.replace(";", ":"))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def dump(self, output_dir):
+        """サンプル結果をファイルに書き出し、そのパスを返す"""
+        safe_tag = re.sub(r"[^0-9A-Za-z_.-]", "_", self.tag or "unknown")
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(output_dir, f"profile-{safe_tag}-{timestamp}.folded")
+
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class LoopMonitor:
+    """
+    ジョブ（ルーム）単位でウォッチドッグとプロファイラを管理する。
+
+    環境変数:
+        LOOP_LAG_INTERVAL_MS: 遅延の計測間隔（デフォルト100ms）
+        LOOP_LAG_THRESHOLD_MS: スタックを記録するブロック時間の閾値（デフォルト200ms）
+        PROFILE_ROOMS: プロファイルするルーム名をカンマ区切りで指定（"*"で全ルーム）
+    SIGUSR1を送るとプロファイラの開始・停止（停止時にファイル出力）を切り替える。
+    ハンドラーはジョブのプロセスにのみ登録されるため、シグナルは開始時にログに出力される
+    ジョブのPIDへ送ること（ワーカーの親プロセスや待機中のプロセスに送ると終了してしまう）。
+    """
+
+    def __init__(self, room_name, output_dir):
+        self.room_name = room_name
+        self.output_dir = output_dir
+
+        interval = int(os.environ.get("LOOP_LAG_INTERVAL_MS", "100")) / 1000
+        threshold = int(os.environ.get("LOOP_LAG_THRESHOLD_MS", "200")) / 1000
+        self.watchdog = LoopLagWatchdog(interval=interval, threshold=threshold)
+        self.profiler = None
+
+        self._loop = None
+        self._signal_installed = False
+        self._stop_task = None
+
+    def start(self):
+        """イベントループのスレッドから呼び出して監視を開始する"""
+        self._loop = asyncio.get_running_loop()
+        self.watchdog.start()
+
+        profile_rooms = [r.strip() for r in os.environ.get("PROFILE_ROOMS", "").split(",") if r.strip()]
+        if "*" in profile_rooms or self.room_name in profile_rooms:
+            self.start_profiler()
+
+        # シグナルによる切り替えはUnixのメインスレッドでのみ利用可能
+        if hasattr(signal, "SIGUSR1"):
+            try:
+                self._loop.add_signal_handler(signal.SIGUSR1, self.toggle_profiler)
+                self._signal_installed = True
+                logger.info(
+                    f"ルーム{self.room_name}のプロファイラはSIGUSR1で切り替えられます (pid={os.getpid()})"
+                )
+            except (NotImplementedError, RuntimeError, ValueError):
+                logger.debug("SIGUSR1によるプロファイラ切り替えは利用できません")
+
+    def start_profiler(self):
+        if self.profiler is not None and self.profiler.running:
+            return
+        self.profiler = SamplingProfiler(tag=self.room_name)
+        self.profiler.start()
+        logger.info(f"ルーム{self.room_name}のプロファイリングを開始しました")
+
+    async def stop_profiler(self):
+        """プロファイラを停止し、結果をファイルに出力する"""
+        if self.profiler is None or not self.profiler.running:
+            return None
+        profiler = self.profiler
+        self.profiler = None
+        return await self._finish_profile(profiler)
+
+    async def _finish_profile(self, profiler):
+        # スレッドの停止とファイル出力はイベントループをブロックしないようexecutorで行う
+        path = await asyncio.get_running_loop().run_in_executor(None, self._stop_and_dump, profiler)
+        logger.info(f"プロファイル結果を出力しました: {path}")
+        return path
+
+    def _stop_and_dump(self, profiler):
+        profiler.stop()
+        return profiler.dump(self.output_dir)
+
+    def toggle_profiler(self):
+        if self.profiler is not None and self.profiler.running:
+            # シグナルハンドラーからは待てないため、停止と出力はタスクとして実行する
+            profiler = self.profiler
+            self.profiler = None
+            self._stop_task = self._loop.create_task(self._finish_profile(profiler))
+        else:
+            self.start_profiler()
+
+    async def aclose(self):
+        """監視を停止し、統計情報をログに出力する"""
+        if self._signal_installed:
+            self._loop.remove_signal_handler(signal.SIGUSR1)
+            self._signal_installed = False
+        if self._stop_task is not None:
+            await self._stop_task
+        await self.stop_profiler()
+        await self.watchdog.aclose()
+        logger.info(f"イベントループ統計 (room={self.room_name}): {self.watchdog.stats()}")
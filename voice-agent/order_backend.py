@@ -0,0 +1,281 @@
+import random
+import datetime
+
+
+class OrderBackend:
+    """
+    注文データを扱うバックエンド。現在はインメモリで動作し、
+    実際の注文システムに置き換えられることを想定している。
+    """
+
+    def __init__(self):
+        # 注文データを保持するディクショナリ
+        self.orders = {}
+
+    async def get_order(self, user_id: int, order_id: int):
+        """注文情報を取得する（読み取りのみで冪等）"""
+
+        # 注文が存在するか確認
+        order_key = f"{user_id}_{order_id}"
+        if order_key not in self.orders:
+            # 注文が存在しない場合は新しく作成
+            order_status = random.choice(["準備中", "配送中"])
+            order_items = self.generate_random_order_items()
+            total_price = sum(item["price"] * item["quantity"] for item in order_items)
+
+            # 注文情報を保存
+            self.orders[order_key] = {
+                "user_id": user_id,
+                "order_id": order_id,
+                "status": order_status,
+                "items": order_items,
+                "total_price": total_price,
+                "created_at": datetime.datetime.now().isoformat()
+            }
+
+        # 注文情報を返す
+        return self.orders[order_key]
+
+    async def cancel_order(self, user_id: int, order_id: int):
+        """注文をキャンセルする"""
+
+        # 注文が存在するか確認
+        order_key = f"{user_id}_{order_id}"
+        if order_key not in self.orders:
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "cancelled": False,
+                "message": "注文が見つかりません"
+            }
+
+        # 注文のステータスに基づいてキャンセル可能かを判断
+        order = self.orders[order_key]
+        if order["status"] == "準備中":
+            # 準備中ならキャンセル可能
+            order["status"] = "キャンセル済み"
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "cancelled": True,
+                "message": "注文が正常にキャンセルされました。返金は3-5営業日以内に処理されます"
+            }
+        elif order["status"] == "配送中":
+            # 配送中はキャンセル不可
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "cancelled": False,
+                "message": "この注文はすでに配送中のためキャンセルできません"
+            }
+        elif order["status"] == "配達完了":
+            # 配達完了はキャンセル不可
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "cancelled": False,
+                "message": "この注文はすでに配達済みのためキャンセルできません"
+            }
+        elif order["status"] == "キャンセル済み":
+            # すでにキャンセル済み
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "cancelled": False,
+                "message": "この注文はすでにキャンセル済みです"
+            }
+
+    async def update_order_quantity(self, user_id: int, order_id: int, product_name: str, new_quantity: int):
+        """注文内容の商品数量を変更する"""
+
+        # 注文が存在するか確認
+        order_key = f"{user_id}_{order_id}"
+        if order_key not in self.orders:
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "updated": False,
+                "message": "注文が見つかりません"
+            }
+
+        # 注文のステータスに基づいて変更可能かを判断
+        order = self.orders[order_key]
+
+        if order["status"] in ["配送中", "配達完了", "キャンセル済み"]:
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "updated": False,
+                "message": f"注文は現在「{order['status']}」状態のため変更できません"
+            }
+
+        # 指定された商品が注文に存在するか確認
+        product_found = False
+        old_quantity = 0
+        old_total = order["total_price"]
+
+        for item in order["items"]:
+            if item["name"] == product_name:
+                product_found = True
+                old_quantity = item["quantity"]
+
+                # 合計金額の更新（古い数量分を引いて新しい数量分を足す）
+                price_diff = (new_quantity - old_quantity) * item["price"]
+                order["total_price"] += price_diff
+
+                # 数量の更新
+                item["quantity"] = new_quantity
+                break
+
+        if not product_found:
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "updated": False,
+                "message": f"注文に商品「{product_name}」が見つかりません"
+            }
+
+        # 注文の更新日時を記録
+        order["updated_at"] = datetime.datetime.now().isoformat()
+
+        # 商品の数量が0になった場合は注文から削除
+        if new_quantity == 0:
+            order["items"] = [item for item in order["items"] if item["name"] != product_name]
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "updated": True,
+                "message": f"商品「{product_name}」を注文から削除しました",
+                "old_quantity": old_quantity,
+                "new_quantity": new_quantity,
+                "old_total": old_total,
+                "new_total": order["total_price"]
+            }
+
+        return {
+            "order_id": order_id,
+            "user_id": user_id,
+            "updated": True,
+            "message": f"商品「{product_name}」の数量を{old_quantity}個から{new_quantity}個に変更しました",
+            "old_quantity": old_quantity,
+            "new_quantity": new_quantity,
+            "old_total": old_total,
+            "new_total": order["total_price"]
+        }
+
+    async def update_order_quantities(self, user_id: int, order_id: int, changes):
+        """
+        複数の商品の数量をまとめて変更する。changesは(商品名, 新しい数量)のリスト。
+        一つでも変更できない商品があれば、どの商品も変更しない。
+        """
+
+        if not changes:
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "updated": False,
+                "message": "変更する商品が指定されていません"
+            }
+
+        # 注文が存在するか確認
+        order_key = f"{user_id}_{order_id}"
+        if order_key not in self.orders:
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "updated": False,
+                "message": "注文が見つかりません"
+            }
+
+        # 注文のステータスに基づいて変更可能かを判断
+        order = self.orders[order_key]
+
+        if order["status"] in ["配送中", "配達完了", "キャンセル済み"]:
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "updated": False,
+                "message": f"注文は現在「{order['status']}」状態のため変更できません"
+            }
+
+        # 変更を適用する前に、すべての商品が注文に存在するか確認
+        items_by_name = {item["name"]: item for item in order["items"]}
+        errors = []
+        seen = set()
+        for product_name, new_quantity in changes:
+            if product_name in seen:
+                errors.append(f"商品「{product_name}」が複数回指定されています")
+                continue
+            seen.add(product_name)
+            if product_name not in items_by_name:
+                errors.append(f"注文に商品「{product_name}」が見つかりません")
+            elif new_quantity < 0:
+                errors.append(f"商品「{product_name}」の数量が正しくありません")
+
+        if errors:
+            return {
+                "order_id": order_id,
+                "user_id": user_id,
+                "updated": False,
+                "message": "、".join(errors) + "。どの商品も変更していません"
+            }
+
+        # すべての変更を適用
+        old_total = order["total_price"]
+        results = []
+        for product_name, new_quantity in changes:
+            item = items_by_name[product_name]
+            results.append({
+                "product_name": product_name,
+                "old_quantity": item["quantity"],
+                "new_quantity": new_quantity
+            })
+            item["quantity"] = new_quantity
+
+        # 数量が0になった商品を注文から削除し、合計金額は最後に一度だけ計算する
+        order["items"] = [item for item in order["items"] if item["quantity"] > 0]
+        order["total_price"] = sum(item["price"] * item["quantity"] for item in order["items"])
+
+        # 注文の更新日時を記録
+        order["updated_at"] = datetime.datetime.now().isoformat()
+
+        return {
+            "order_id": order_id,
+            "user_id": user_id,
+            "updated": True,
+            "message": f"{len(results)}件の商品の数量を変更しました",
+            "changes": results,
+            "old_total": old_total,
+            "new_total": order["total_price"]
+        }
+
+    def generate_random_order_items(self, min_items=1, max_items=3):
+        """
+        ランダムなEC商品と個数のリストを生成する関数
+        """
+        # ECサイトの商品リスト（商品名と固定金額）
+        products = [
+            {"name": "ワイヤレスイヤホン", "price": 12800},
+            {"name": "スマートウォッチ", "price": 24500},
+            {"name": "ポータブル充電器", "price": 3980}
+        ]
+
+        # ランダムに選ぶ商品数を決定
+        num_items = random.randint(min_items, max_items)
+
+        # 重複なしで商品をランダムに選択
+        num_items = min(num_items, len(products))
+        selected_products = random.sample(products, num_items)
+
+        # 各商品について数量を決定
+        order_items = []
+        for product in selected_products:
+            quantity = random.randint(1, 3)  # 1〜3個をランダムに選択
+
+            order_items.append({
+                "name": product["name"],
+                "quantity": quantity,
+                "price": product["price"]
+            })
+
+        return order_items
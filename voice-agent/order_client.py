@@ -0,0 +1,118 @@
+import asyncio
+import logging
+
+from order_backend import OrderBackend
+from resilience import CircuitBreaker, CircuitOpenError, ResilienceMetrics, resilient_call
+
+# ハンドラーの設定はagent.pyで行われるため、ここではロガーの取得のみ
+logger = logging.getLogger("voice-agent")
+
+# 注文操作ごとのバックエンド呼び出し設定
+# timeout: 呼び出し全体の期限（秒）
+# hedge_delay: この時間内に応答がなければ二つ目のリクエストを送る（冪等な読み取りのみ）
+# idempotent: 読み取りのみの操作かどうか（書き込みはタイムアウト時に結果が不明となる）
+BACKEND_CALL_POLICIES = {
+    "check_order_details": {"timeout": 3.0, "hedge_delay": 1.0, "idempotent": True},
+    "cancel_order": {"timeout": 5.0, "hedge_delay": None, "idempotent": False},
+    "update_order_quantity": {"timeout": 5.0, "hedge_delay": None, "idempotent": False},
+    "update_order_quantities": {"timeout": 5.0, "hedge_delay": None, "idempotent": False},
+}
+
+# バックエンドが応答しない場合にLLMへ返すメッセージ
+BACKEND_FALLBACK_MESSAGE = "ただいま注文システムが混み合っており処理できませんでした。少々お待ちいただき、もう一度お試しください"
+
+# 書き込みがタイムアウトした場合にLLMへ返すメッセージ（処理が反映されている可能性がある）
+BACKEND_UNKNOWN_RESULT_MESSAGE = "ただいま注文システムの応答が遅れており、処理が完了したか確認できませんでした。少々お待ちいただき、注文内容を確認してから再度お手続きください"
+
+
+class OrderClient:
+    """
+    AssistantFncから注文バックエンドを呼び出すクライアント。
+    操作ごとのタイムアウト・ヘッジリクエスト・サーキットブレーカーを適用し、
+    失敗した場合はLLMがそのまま伝えられる結果を返す。
+    """
+
+    def __init__(self, backend=None, breaker=None, policies=None):
+        # 注文データを扱うバックエンド
+        self.backend = backend if backend is not None else OrderBackend()
+        # バックエンド呼び出しのサーキットブレーカーと計測値
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.metrics = ResilienceMetrics()
+        self.policies = policies if policies is not None else BACKEND_CALL_POLICIES
+
+    async def _call(self, name, func, *args, fallback):
+        """
+        バックエンドを呼び出し、失敗した場合はfallbackにメッセージを加えた結果を返す。
+        """
+        policy = self.policies[name]
+        try:
+            return await resilient_call(
+                name,
+                func,
+                *args,
+                timeout=policy["timeout"],
+                hedge_delay=policy["hedge_delay"],
+                breaker=self.breaker,
+                metrics=self.metrics,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"バックエンド呼び出しがタイムアウトしました: {name}")
+            if not policy["idempotent"]:
+                # 書き込みはバックエンドに反映されている可能性があるため、確認を促す
+                return {**fallback, "message": BACKEND_UNKNOWN_RESULT_MESSAGE}
+        except CircuitOpenError:
+            logger.warning(f"サーキットブレーカーによりバックエンド呼び出しを行いませんでした: {name}")
+        except Exception as e:
+            logger.error(f"バックエンド呼び出し中にエラーが発生しました: {name} ({str(e)})")
+
+        return {**fallback, "message": BACKEND_FALLBACK_MESSAGE}
+
+    async def check_order_details(self, user_id, order_id):
+        """注文のステータスを取得する"""
+        return await self._call(
+            "check_order_details",
+            self.backend.get_order,
+            user_id,
+            order_id,
+            fallback={"user_id": user_id, "order_id": order_id, "available": False},
+        )
+
+    async def check_multiple_orders(self, user_id, order_ids):
+        """複数の注文のステータスを並行して取得し、一つの結果にまとめる"""
+        orders = await asyncio.gather(*(
+            self.check_order_details(user_id, order_id) for order_id in order_ids
+        ))
+        return {"user_id": user_id, "orders": list(orders)}
+
+    async def cancel_order(self, user_id, order_id):
+        """注文をキャンセルする"""
+        return await self._call(
+            "cancel_order",
+            self.backend.cancel_order,
+            user_id,
+            order_id,
+            fallback={"order_id": order_id, "user_id": user_id, "cancelled": False},
+        )
+
+    async def update_order_quantity(self, user_id, order_id, product_name, new_quantity):
+        """注文内容の商品数量を変更する"""
+        return await self._call(
+            "update_order_quantity",
+            self.backend.update_order_quantity,
+            user_id,
+            order_id,
+            product_name,
+            new_quantity,
+            fallback={"order_id": order_id, "user_id": user_id, "updated": False},
+        )
+
+    async def update_order_quantities(self, user_id, order_id, changes):
+        """注文内容の複数の商品数量をまとめて変更する"""
+        return await self._call(
+            "update_order_quantities",
+            self.backend.update_order_quantities,
+            user_id,
+            order_id,
+            changes,
+            fallback={"order_id": order_id, "user_id": user_id, "updated": False},
+        )
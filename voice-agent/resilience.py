@@ -0,0 +1,168 @@
+import asyncio
+import collections
+import logging
+import time
+
+# ハンドラーの設定はagent.pyで行われるため、ここではロガーの取得のみ
+logger = logging.getLogger("voice-agent")
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているため呼び出しを行わなかったことを示す"""
+
+
+class CircuitBreaker:
+    """
+    連続した失敗回数が閾値に達したら一定時間呼び出しを遮断し、即座に失敗させる。
+    遮断時間の経過後は一度だけ試行を許可し(half_open)、成功すれば復帰する。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, clock=time.monotonic):
+        # 遮断するまでの連続失敗回数
+        self.failure_threshold = failure_threshold
+        # 遮断を続ける時間（秒）
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow_request(self):
+        """呼び出しを行ってよいかを返す"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            # half_openでは一度に一つの試行のみ許可する
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release(self):
+        """結果が得られないまま試行が中断された場合に、half_openの試行枠を戻す"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info("サーキットブレーカーが復帰しました")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(f"サーキットブレーカーが開きました（連続失敗{self._failures}回）")
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+class ResilienceMetrics:
+    """
+    呼び出しごとの結果（success, hedged_success, timeout, error, rejected）と所要時間を集計する。
+    hedged_successはヘッジとして送った二つ目のリクエストの結果が採用されたことを示す。
+    """
+
+    def __init__(self):
+        # (関数名, 結果) -> 回数
+        self.counts = collections.Counter()
+        # 関数名 -> 所要時間（秒）のリスト
+        self.latencies = collections.defaultdict(list)
+
+    def record(self, name, outcome, latency):
+        self.counts[(name, outcome)] += 1
+        self.latencies[name].append(latency)
+        logger.info(f"backend call: function={name} outcome={outcome} latency={latency * 1000:.0f}ms")
+
+    def snapshot(self):
+        """集計結果を辞書で返す"""
+        result = {}
+        for (name, outcome), count in self.counts.items():
+            result.setdefault(name, {})[outcome] = count
+        for name, values in self.latencies.items():
+            result.setdefault(name, {})["max_latency_ms"] = round(max(values) * 1000, 1)
+        return result
+
+
+async def _hedged(func, args, kwargs, hedge_delay):
+    # 最初のリクエストがhedge_delay以内に終わらなければ二つ目を送り、先に成功した方を採用する
+    # 戻り値は(結果, ヘッジのリクエストが採用されたか)
+    first = asyncio.ensure_future(func(*args, **kwargs))
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if done:
+            return first.result(), False
+
+        hedge = asyncio.ensure_future(func(*args, **kwargs))
+        tasks.add(hedge)
+        pending = set(tasks)
+        last_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is hedge
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def resilient_call(name, func, *args, timeout, hedge_delay=None, breaker=None, metrics=None, **kwargs):
+    """
+    バックエンド呼び出しにタイムアウト・ヘッジリクエスト・サーキットブレーカーを適用する。
+    失敗時はasyncio.TimeoutError、CircuitOpenError、または呼び出し先の例外を送出する。
+    hedge_delayは冪等な読み取り操作にのみ指定すること。
+    """
+    started = time.monotonic()
+
+    if breaker is not None and not breaker.allow_request():
+        if metrics is not None:
+            metrics.record(name, "rejected", 0.0)
+        raise CircuitOpenError(name)
+
+    try:
+        if hedge_delay is not None:
+            result, hedged = await asyncio.wait_for(_hedged(func, args, kwargs, hedge_delay), timeout)
+        else:
+            result, hedged = await asyncio.wait_for(func(*args, **kwargs), timeout), False
+    except asyncio.CancelledError:
+        if breaker is not None:
+            breaker.release()
+        raise
+    except asyncio.TimeoutError:
+        if breaker is not None:
+            breaker.record_failure()
+        if metrics is not None:
+            metrics.record(name, "timeout", time.monotonic() - started)
+        raise
+    except Exception:
+        if breaker is not None:
+            breaker.record_failure()
+        if metrics is not None:
+            metrics.record(name, "error", time.monotonic() - started)
+        raise
+
+    if breaker is not None:
+        breaker.record_success()
+    if metrics is not None:
+        metrics.record(name, "hedged_success" if hedged else "success", time.monotonic() - started)
+    return result
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+
+# ハンドラーの設定はagent.pyで行われるため、ここではロガーの取得のみ
+logger = logging.getLogger("voice-agent")
+
+
+class SpeculationStats:
+    """
+    投機的生成の結果を集計する。
+    """
+
+    def __init__(self):
+        # EOU確定前にLLMリクエストを開始した回数
+        self.started = 0
+        # 投機した応答がそのまま採用された回数
+        self.hits = 0
+        # 投機した応答が破棄された回数
+        self.misses = 0
+        # EOU確率が閾値未満のため投機を見送った回数
+        self.held = 0
+        # 破棄された応答で消費したトークン数（直近のLLM呼び出しのトークン数から推定）
+        self.wasted_tokens = 0
+
+    def hit_rate(self):
+        decided = self.hits + self.misses
+        return self.hits / decided if decided else 0.0
+
+    def snapshot(self):
+        """集計結果を辞書で返す"""
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "held": self.held,
+            "hit_rate": round(self.hit_rate(), 3),
+            "wasted_tokens": self.wasted_tokens
+        }
+
+
+class SpeculativeReplyGate:
+    """
+    VoicePipelineAgentのpreemptive_synthesisと組み合わせて使う、投機的生成のゲート。
+
+    preemptive_synthesisを有効にすると、パイプラインはEOUの確定を待たずに
+    STTの確定文字起こしの時点でLLMとTTSを開始し、ユーザーが話し続けた場合は破棄する。
+    このゲートはbefore_llm_cbとして呼ばれ、EOU確率がspeculate_threshold以上の場合は
+    すぐにLLMを開始し、それ未満の場合は発話の終了からhold_delayが経つまで開始を遅らせる。
+
+    パイプラインはEOU確率がunlikely_threshold以上であればmin_endpointing_delayで応答を確定し、
+    保留中の応答をすぐに再生する。そのためspeculate_thresholdはunlikely_threshold以下とし、
+    パイプライン自身がmax_endpointing_delayだけ待つ発話でのみ開始を遅らせる。
+    """
+
+    def __init__(self, predict_eou, unlikely_threshold, speculate_threshold=None, hold_delay=5.0):
+        # chat_ctxを受け取り、発話終了の確率を返す非同期関数
+        self.predict_eou = predict_eou
+        # パイプラインがmax_endpointing_delayだけ待つEOU確率の上限（ターン検出器のunlikely_threshold）
+        self.unlikely_threshold = unlikely_threshold
+        # 投機を開始するEOU確率の下限（unlikely_thresholdを超えないようにする）
+        if speculate_threshold is None:
+            speculate_threshold = unlikely_threshold
+        elif speculate_threshold > unlikely_threshold:
+            logger.warning(
+                f"投機の閾値{speculate_threshold}がターン検出器の閾値{unlikely_threshold}を超えているため、"
+                f"{unlikely_threshold}を使用します"
+            )
+            speculate_threshold = unlikely_threshold
+        self.speculate_threshold = speculate_threshold
+        # 投機を見送った場合に、発話の終了からLLMの開始を遅らせる時間（秒、max_endpointing_delay）
+        self.hold_delay = hold_delay
+
+        self.stats = SpeculationStats()
+        # 前回の確定以降に投機したユーザー発話
+        self._speculated_texts = []
+        # 直近のLLM呼び出しで消費したトークン数
+        self._last_request_tokens = 0
+        # ユーザーが直近に話し終えた時刻
+        self._end_of_speech = None
+
+    async def before_llm_cb(self, agent, chat_ctx):
+        """VoicePipelineAgentのbefore_llm_cbとして登録する"""
+        user_text = chat_ctx.messages[-1].content
+
+        # パイプラインの待機時間は発話の終了から数えるため、保留時間も同じ時刻から数える
+        end_of_speech = self._end_of_speech if self._end_of_speech is not None else time.monotonic()
+        try:
+            probability = await self.predict_eou(chat_ctx)
+        except (asyncio.TimeoutError, TimeoutError, AssertionError):
+            # 推論プロセスが応答しない場合は、保留せずに投機する
+            logger.warning("EOU推論が応答しないため、保留せずに投機的生成を開始します")
+            probability = None
+
+        if probability is not None and probability < self.speculate_threshold:
+            # ユーザーが話し続ける可能性が高く、パイプラインも最大待機時間だけ待つため、それに合わせて待つ
+            # 待機中に次の発話が来た場合は、パイプラインによってこのタスクがキャンセルされる
+            self.stats.held += 1
+            await asyncio.sleep(max(0.0, self.hold_delay - (time.monotonic() - end_of_speech)))
+        else:
+            self.stats.started += 1
+            self._speculated_texts.append(user_text)
+            logger.debug(f"投機的生成を開始します (eou={probability}): {user_text}")
+
+        return agent.llm.chat(chat_ctx=chat_ctx, fnc_ctx=agent.fnc_ctx)
+
+    def on_user_stopped_speaking(self):
+        """VADがユーザーの発話の終了を検出したときに呼び出す"""
+        self._end_of_speech = time.monotonic()
+
+    def on_user_speech_committed(self, text):
+        """ユーザー発話がチャットコンテキストに確定したときに呼び出す"""
+        for speculated in self._speculated_texts:
+            if speculated == text:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+                self.stats.wasted_tokens += self._last_request_tokens
+        self._speculated_texts = []
+
+    def on_llm_metrics(self, prompt_tokens, completion_tokens, cancelled=False):
+        """LLMのメトリクスを受け取り、破棄時のトークン数の推定に使う"""
+        if cancelled:
+            # キャンセルされたリクエストはトークン数が0で報告されるため、推定には使わない
+            return
+        self._last_request_tokens = prompt_tokens + completion_tokens
@@ -0,0 +1,188 @@
+import asyncio
+from types import SimpleNamespace
+
+from endpointing import AdaptiveEndpointing, MAX_ENDPOINTING_DELAY, MIN_ENDPOINTING_DELAY, classify_transcript
+from order_client import BACKEND_FALLBACK_MESSAGE, BACKEND_UNKNOWN_RESULT_MESSAGE
+
+# 通話から書き起こした、発話区間ごとの文字起こしと次の区間までの間（秒）
+RECORDED_CALLS = [
+    # ユーザー番号を2桁と3桁に区切って読み上げる
+    [("ユーザー番号は12", 1.2), ("345です", None)],
+    # 一桁ずつ間を空けて読み上げる
+    [("注文番号は6", 0.9), ("7", 1.1), ("8", 0.8), ("9", 1.0), ("0", None)],
+    # 全角と漢数字が混ざる
+    [("ユーザー番号は１２３", 1.5), ("四五", None)],
+    # 一息で読み上げる
+    [("注文番号は24680です", None)],
+]
+
+
+class StubEOUModel:
+    """
+    どの発話にも同じ確率を返すターン検出モデル。
+    閾値と対応言語はturn_detector.EOUModelに合わせる。
+    """
+
+    def __init__(self, probability=0.9):
+        self.probability = probability
+        self.calls = 0
+
+    def unlikely_threshold(self):
+        return 0.0289
+
+    def supports_language(self, language):
+        return language is not None and language.lower().split("-")[0] in ("en", "english")
+
+    async def predict_end_of_turn(self, chat_ctx):
+        self.calls += 1
+        return self.probability
+
+
+def make_chat_ctx(text, question=None):
+    messages = []
+    if question is not None:
+        messages.append(SimpleNamespace(role="assistant", content=question))
+    messages.append(SimpleNamespace(role="user", content=text))
+    return SimpleNamespace(messages=messages)
+
+
+def endpointing_delay(turn_detector, text, question=None, language="ja"):
+    """VoicePipelineAgentと同じ順序でターン検出器を呼び出し、応答までの待機時間を返す"""
+    if not turn_detector.supports_language(language):
+        # 対応しない言語ではターン検出器を使わない
+        return MIN_ENDPOINTING_DELAY
+    probability = asyncio.run(turn_detector.predict_end_of_turn(make_chat_ctx(text, question)))
+    if probability < turn_detector.unlikely_threshold():
+        return MAX_ENDPOINTING_DELAY
+    return MIN_ENDPOINTING_DELAY
+
+
+def replay(call, turn_detector, tracker):
+    """
+    録音した発話を再生し、IDを言い終える前にターンが確定してしまった場合は
+    エージェントの聞き返しをtrackerに記録する。
+    """
+    transcript = ""
+    for segment, pause in call:
+        transcript = f"{transcript} {segment}".strip()
+        if pause is None:
+            break
+        if pause > endpointing_delay(turn_detector, transcript):
+            # 途中で応答してしまい、聞き返しが発生する
+            tracker.on_agent_speech_committed("申し訳ありません、聞き取れませんでした。もう一度ゆっくりお願いします")
+            transcript = ""
+
+
+def test_classify_recorded_partial_transcripts():
+    assert classify_transcript("ユーザー番号は12") == "partial_id"
+    assert classify_transcript("ユーザー番号は12 345です") == "complete_id"
+    assert classify_transcript("注文番号は6 7 8") == "partial_id"
+    assert classify_transcript("ユーザー番号は１２３ 四五。") == "complete_id"
+    assert classify_transcript("12345と、注文番号は678") == "partial_id"
+    assert classify_transcript("1234567890") == "complete_id"
+    assert classify_transcript("はい、そうです") == "confirmation"
+    assert classify_transcript("はい、キャンセルしてください") == "other"
+    assert classify_transcript("はい") == "confirmation"
+    assert classify_transcript("違います。") == "confirmation"
+    assert classify_transcript("注文をキャンセルしたいです") == "other"
+
+
+def test_bare_quantity_answers_are_not_partial_ids():
+    assert classify_transcript("2") == "other"
+    assert classify_transcript("ワイヤレスイヤホンを2") == "other"
+    assert classify_transcript("イヤホンを2個、充電器を1") == "other"
+    assert classify_transcript("一") == "other"
+    # 言い終えたIDの後に続く数量
+    assert classify_transcript("注文番号は67890の、イヤホンを2") == "other"
+    assert classify_transcript("ユーザー番号12345、充電器は3") == "other"
+    # 番号を尋ねられた直後の短い数字は読み上げの途中とみなす
+    assert classify_transcript("12", expecting_id=True) == "partial_id"
+    assert classify_transcript("一", expecting_id=True) == "partial_id"
+
+
+def test_delay_depends_on_the_last_agent_question():
+    model = StubEOUModel(probability=0.9)
+    turn_detector = AdaptiveEndpointing(model)
+
+    # 数量を尋ねた後の回答は待機時間を延ばさない
+    assert endpointing_delay(turn_detector, "2", "何個に変更しますか？") == MIN_ENDPOINTING_DELAY
+    assert endpointing_delay(turn_detector, "2", "注文番号は12345ですね。何個に変更しますか") == MIN_ENDPOINTING_DELAY
+    # 番号を尋ねた後の短い数字は待機時間を延ばす
+    assert endpointing_delay(turn_detector, "12", "ユーザー番号を教えていただけますか？") == MAX_ENDPOINTING_DELAY
+    assert endpointing_delay(turn_detector, "6 7", "注文番号をお願いします") == MAX_ENDPOINTING_DELAY
+    assert turn_detector.stats() == {"extended": 2, "shortened": 0, "reasks": 0}
+
+
+def test_estimate_does_not_update_stats():
+    model = StubEOUModel(probability=0.9)
+    turn_detector = AdaptiveEndpointing(model)
+
+    async def run():
+        # 投機的生成のゲートとパイプラインが同じ発話を判定する
+        chat_ctx = make_chat_ctx("注文番号は678")
+        gate_probability = await turn_detector.estimate_end_of_turn(chat_ctx)
+        pipeline_probability = await turn_detector.predict_end_of_turn(chat_ctx)
+        return gate_probability, pipeline_probability
+
+    assert asyncio.run(run()) == (0.0, 0.0)
+    assert turn_detector.stats() == {"extended": 1, "shortened": 0, "reasks": 0}
+
+
+def test_only_reasks_for_digits_are_counted():
+    turn_detector = AdaptiveEndpointing(StubEOUModel())
+
+    # バックエンドの障害時の案内は聞き返しではない
+    turn_detector.on_agent_speech_committed(BACKEND_FALLBACK_MESSAGE)
+    turn_detector.on_agent_speech_committed(BACKEND_UNKNOWN_RESULT_MESSAGE)
+    assert turn_detector.stats()["reasks"] == 0
+
+    turn_detector.on_agent_speech_committed("申し訳ありません、聞き取れませんでした")
+    turn_detector.on_agent_speech_committed("恐れ入りますが、注文番号をもう一度お願いします")
+    assert turn_detector.stats()["reasks"] == 2
+
+
+def test_delay_is_extended_for_partial_id_and_shortened_for_complete_id():
+    model = StubEOUModel(probability=0.01)
+    turn_detector = AdaptiveEndpointing(model)
+
+    assert endpointing_delay(turn_detector, "注文番号は678") == MAX_ENDPOINTING_DELAY
+    assert endpointing_delay(turn_detector, "注文番号は67890です") == MIN_ENDPOINTING_DELAY
+    assert endpointing_delay(turn_detector, "はい") == MIN_ENDPOINTING_DELAY
+    # IDや確認以外は、日本語に対応しないモデルの代わりにmin_endpointing_delayで応答する
+    assert endpointing_delay(turn_detector, "えっと") == MIN_ENDPOINTING_DELAY
+    assert model.calls == 0
+    assert turn_detector.stats() == {"extended": 1, "shortened": 2, "reasks": 0}
+
+
+def test_pipeline_uses_wrapper_for_japanese_transcripts():
+    model = StubEOUModel(probability=0.01)
+
+    # ラップしないモデルは日本語に対応しないため、パイプラインから呼ばれない
+    assert endpointing_delay(model, "注文番号は678") == MIN_ENDPOINTING_DELAY
+    assert model.calls == 0
+
+    turn_detector = AdaptiveEndpointing(model)
+    assert turn_detector.supports_language("ja")
+    assert turn_detector.supports_language("ja-JP")
+    assert turn_detector.supports_language("japanese")
+    assert endpointing_delay(turn_detector, "注文番号は678") == MAX_ENDPOINTING_DELAY
+    assert turn_detector.unlikely_threshold() == 0.0289
+
+    # モデルが対応する言語では、IDや確認以外はラップしたモデルの判定を使う
+    assert endpointing_delay(turn_detector, "um", language="en") == MAX_ENDPOINTING_DELAY
+    assert model.calls == 1
+    assert not turn_detector.supports_language("fr")
+
+
+def test_recorded_calls_need_fewer_reasks():
+    # 固定の待機時間（ラップしないモデル）では、桁の間の沈黙でターンが確定してしまう
+    fixed_tracker = AdaptiveEndpointing(StubEOUModel())
+    for call in RECORDED_CALLS:
+        replay(call, StubEOUModel(), fixed_tracker)
+
+    turn_detector = AdaptiveEndpointing(StubEOUModel())
+    for call in RECORDED_CALLS:
+        replay(call, turn_detector, turn_detector)
+
+    assert fixed_tracker.stats()["reasks"] == 6
+    assert turn_detector.stats()["reasks"] == 0
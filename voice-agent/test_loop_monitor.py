@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from loop_monitor import LoopLagWatchdog, LoopMonitor, SamplingProfiler
+
+
+def blocking_handler():
+    # 同期的な処理でイベントループをブロックする
+    time.sleep(0.3)
+
+
+def test_watchdog_captures_blocking_stack():
+    async def run():
+        watchdog = LoopLagWatchdog(interval=0.02, threshold=0.1)
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        blocking_handler()
+        await asyncio.sleep(0.05)
+        await watchdog.aclose()
+        return watchdog
+
+    watchdog = asyncio.run(run())
+    assert watchdog.stall_count == 1
+    assert "blocking_handler" in watchdog.stalls[0]["stack"]
+    assert watchdog.stats()["max_lag_ms"] >= 200
+    # 検知時点ではなく、ループが再開するまでのブロック時間が記録される
+    assert watchdog.stalls[0]["blocked_ms"] >= 250
+
+
+def test_watchdog_records_full_length_of_long_stall():
+    async def run():
+        watchdog = LoopLagWatchdog(interval=0.02, threshold=0.1)
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.8)
+        await asyncio.sleep(0.05)
+        await watchdog.aclose()
+        return watchdog
+
+    watchdog = asyncio.run(run())
+    assert watchdog.stall_count == 1
+    assert watchdog.stalls[0]["blocked_ms"] >= 750
+
+
+def test_watchdog_ignores_block_below_threshold():
+    async def run():
+        watchdog = LoopLagWatchdog(interval=0.1, threshold=0.2)
+        watchdog.start()
+        await asyncio.sleep(0.15)
+        for _ in range(3):
+            time.sleep(0.13)
+            await asyncio.sleep(0.15)
+        await watchdog.aclose()
+        return watchdog
+
+    watchdog = asyncio.run(run())
+    assert watchdog.stall_count == 0
+
+
+def idle_cpu_time(duration, with_watchdog):
+    # 何もしないイベントループで消費したプロセス全体のCPU時間を返す
+    async def run():
+        watchdog = LoopLagWatchdog() if with_watchdog else None
+        if watchdog is not None:
+            watchdog.start()
+        started = time.process_time()
+        await asyncio.sleep(duration)
+        used = time.process_time() - started
+        if watchdog is not None:
+            await watchdog.aclose()
+        return used
+
+    return asyncio.run(run())
+
+
+def test_watchdog_idle_overhead():
+    duration = 2.0
+    baseline = idle_cpu_time(duration, with_watchdog=False)
+    monitored = idle_cpu_time(duration, with_watchdog=True)
+
+    # アイドル時のウォッチドッグによるCPU使用率の増加は2%未満
+    assert (monitored - baseline) / duration < 0.02
+
+
+def test_profiler_dumps_folded_stacks(tmp_path):
+    async def run():
+        profiler = SamplingProfiler(tag="room/01", interval=0.002)
+        profiler.start()
+        blocking_handler()
+        profiler.stop()
+        return profiler
+
+    profiler = asyncio.run(run())
+    path = profiler.dump(str(tmp_path))
+
+    assert "profile-room_01-" in path
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert any("blocking_handler" in line for line in lines)
+    # 各行は「スタック サンプル数」の形式
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_toggle_profiler_dumps_in_background(tmp_path):
+    async def run():
+        monitor = LoopMonitor(room_name="room-a", output_dir=str(tmp_path))
+        monitor.start()
+        monitor.toggle_profiler()
+        blocking_handler()
+        # シグナルハンドラーと同じく同期的に呼び出し、出力はタスクに任せる
+        monitor.toggle_profiler()
+        assert monitor.profiler is None
+        await monitor.aclose()
+
+    asyncio.run(run())
+    assert len(list(tmp_path.glob("profile-room-a-*.folded"))) == 1
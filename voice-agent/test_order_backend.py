@@ -0,0 +1,188 @@
+import asyncio
+import copy
+
+from order_backend import OrderBackend
+from order_client import OrderClient
+
+ORDER = {
+    "user_id": 12345,
+    "order_id": 67890,
+    "status": "準備中",
+    "items": [
+        {"name": "ワイヤレスイヤホン", "quantity": 1, "price": 12800},
+        {"name": "スマートウォッチ", "quantity": 2, "price": 24500},
+        {"name": "ポータブル充電器", "quantity": 3, "price": 3980}
+    ],
+    "total_price": 12800 + 24500 * 2 + 3980 * 3,
+    "created_at": "2025-01-01T00:00:00"
+}
+
+# 会話の台本ごとの、ユーザーが一度に依頼する数量変更
+SCENARIOS = [
+    [("ワイヤレスイヤホン", 2), ("スマートウォッチ", 1), ("ポータブル充電器", 0)],
+    [("スマートウォッチ", 3), ("ポータブル充電器", 1)],
+    [("ワイヤレスイヤホン", 0)],
+]
+
+# 会話の台本ごとの、ユーザーが一度に確認を依頼する注文番号
+LOOKUP_SCENARIOS = [
+    [67890, 67891, 67892],
+    [67890, 67891],
+    [67890],
+]
+
+
+class ScriptedLLM:
+    """
+    台本の依頼を処理するLLMの代わり。completionごとに一つのツール呼び出しを返し、
+    すべての結果が揃ったら最終的な応答を返す。completionの回数をround_tripsに数える。
+    """
+
+    def __init__(self, client, batch):
+        self.client = client
+        # まとめて処理するツールを使えるかどうか
+        self.batch = batch
+        self.round_trips = 0
+
+    def _plan_changes(self, changes):
+        if self.batch:
+            return [lambda: self.client.update_order_quantities(12345, 67890, changes)]
+        return [
+            lambda name=name, quantity=quantity: self.client.update_order_quantity(12345, 67890, name, quantity)
+            for name, quantity in changes
+        ]
+
+    def _plan_lookups(self, order_ids):
+        if self.batch:
+            return [lambda: self.client.check_multiple_orders(12345, order_ids)]
+        return [lambda order_id=order_id: self.client.check_order_details(12345, order_id) for order_id in order_ids]
+
+    async def handle(self, plan):
+        results = []
+        for tool_call in plan:
+            # ツール呼び出しを返すcompletion
+            self.round_trips += 1
+            results.append(await tool_call())
+        # ツールの結果を受けて応答を返すcompletion
+        self.round_trips += 1
+        return results
+
+    async def change_quantities(self, changes):
+        return await self.handle(self._plan_changes(changes))
+
+    async def check_orders(self, order_ids):
+        return await self.handle(self._plan_lookups(order_ids))
+
+
+def make_backend():
+    backend = OrderBackend()
+    backend.orders["12345_67890"] = copy.deepcopy(ORDER)
+    return backend
+
+
+def test_batch_update_applies_all_changes_with_single_total():
+    backend = make_backend()
+    changes = [("ワイヤレスイヤホン", 2), ("ポータブル充電器", 0)]
+
+    result = asyncio.run(backend.update_order_quantities(12345, 67890, changes))
+
+    order = backend.orders["12345_67890"]
+    assert result["updated"] is True
+    assert result["old_total"] == ORDER["total_price"]
+    assert result["new_total"] == 12800 * 2 + 24500 * 2
+    assert order["total_price"] == result["new_total"]
+    assert [item["name"] for item in order["items"]] == ["ワイヤレスイヤホン", "スマートウォッチ"]
+
+
+def test_batch_update_is_atomic_when_one_product_is_missing():
+    backend = make_backend()
+    changes = [("ワイヤレスイヤホン", 5), ("ノートパソコン", 1)]
+
+    result = asyncio.run(backend.update_order_quantities(12345, 67890, changes))
+
+    assert result["updated"] is False
+    assert "ノートパソコン" in result["message"]
+    assert backend.orders["12345_67890"] == ORDER
+
+
+def test_batch_update_rejected_for_shipped_order():
+    backend = make_backend()
+    backend.orders["12345_67890"]["status"] = "配送中"
+
+    result = asyncio.run(backend.update_order_quantities(12345, 67890, [("ワイヤレスイヤホン", 2)]))
+
+    assert result["updated"] is False
+    assert backend.orders["12345_67890"]["items"] == ORDER["items"]
+
+
+def test_batch_update_rejects_empty_changes():
+    backend = make_backend()
+
+    result = asyncio.run(backend.update_order_quantities(12345, 67890, []))
+
+    assert result["updated"] is False
+    assert backend.orders["12345_67890"] == ORDER
+
+
+def test_batch_update_rejects_duplicated_product():
+    backend = make_backend()
+    changes = [("スマートウォッチ", 5), ("スマートウォッチ", 0)]
+
+    result = asyncio.run(backend.update_order_quantities(12345, 67890, changes))
+
+    assert result["updated"] is False
+    assert "スマートウォッチ" in result["message"]
+    assert backend.orders["12345_67890"] == ORDER
+
+
+def test_batch_update_matches_sequential_single_updates():
+    for changes in SCENARIOS:
+        single_backend = make_backend()
+        for product_name, new_quantity in changes:
+            asyncio.run(single_backend.update_order_quantity(12345, 67890, product_name, new_quantity))
+
+        batch_backend = make_backend()
+        asyncio.run(batch_backend.update_order_quantities(12345, 67890, changes))
+
+        # 一件ずつ変更した場合と最終的な注文内容は同じになる
+        single_order = single_backend.orders["12345_67890"]
+        batch_order = batch_backend.orders["12345_67890"]
+        assert batch_order["items"] == single_order["items"]
+        assert batch_order["total_price"] == single_order["total_price"]
+
+
+def run_scripted_scenarios(batch):
+    async def run():
+        round_trips = 0
+        orders = []
+        for changes in SCENARIOS:
+            client = OrderClient(make_backend())
+            scripted = ScriptedLLM(client, batch)
+            await scripted.change_quantities(changes)
+            round_trips += scripted.round_trips
+            order = client.backend.orders["12345_67890"]
+            orders.append((order["items"], order["total_price"]))
+        for order_ids in LOOKUP_SCENARIOS:
+            scripted = ScriptedLLM(OrderClient(make_backend()), batch)
+            results = await scripted.check_orders(order_ids)
+            round_trips += scripted.round_trips
+            if batch:
+                results = results[0]["orders"]
+            orders.append([order["order_id"] for order in results])
+        return round_trips, orders
+
+    return asyncio.run(run())
+
+
+def test_batch_tools_save_llm_round_trips_on_scripted_scenarios():
+    single_round_trips, single_orders = run_scripted_scenarios(batch=False)
+    batch_round_trips, batch_orders = run_scripted_scenarios(batch=True)
+
+    # 処理結果は同じで、LLMとのやり取りの回数だけが減る
+    assert batch_orders == single_orders
+    saved = single_round_trips - batch_round_trips
+    print(f"LLMの往復回数: 一件ずつ={single_round_trips} まとめて={batch_round_trips} 削減={saved}")
+    # 数量変更6件と注文確認6件を、それぞれ台本ごとに一回のツール呼び出しで処理する
+    assert single_round_trips == (6 + 3) + (6 + 3)
+    assert batch_round_trips == (3 + 3) + (3 + 3)
+    assert saved == 6
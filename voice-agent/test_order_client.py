@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from order_client import (
+    BACKEND_CALL_POLICIES,
+    BACKEND_FALLBACK_MESSAGE,
+    BACKEND_UNKNOWN_RESULT_MESSAGE,
+    OrderClient,
+)
+from resilience import CircuitBreaker
+
+
+def make_policies(timeout):
+    # 本番の設定をもとに、テスト用に期限だけ短くする
+    return {
+        name: {**policy, "timeout": timeout, "hedge_delay": policy["hedge_delay"] and timeout / 4}
+        for name, policy in BACKEND_CALL_POLICIES.items()
+    }
+
+
+def test_every_tool_operation_has_a_policy():
+    client = OrderClient()
+    assert set(BACKEND_CALL_POLICIES) == {
+        "check_order_details",
+        "cancel_order",
+        "update_order_quantity",
+        "update_order_quantities",
+    }
+    # 書き込みはヘッジしない
+    for name, policy in client.policies.items():
+        if not policy["idempotent"]:
+            assert policy["hedge_delay"] is None
+
+
+def test_read_timeout_returns_fallback(faulty_backend):
+    client = OrderClient(faulty_backend(delays=[1.0, 1.0]), policies=make_policies(0.1))
+
+    result = asyncio.run(client.check_order_details(12345, 67890))
+
+    assert result == {"user_id": 12345, "order_id": 67890, "available": False, "message": BACKEND_FALLBACK_MESSAGE}
+    assert client.metrics.counts[("check_order_details", "timeout")] == 1
+
+
+def test_write_timeout_reports_unknown_result(faulty_backend):
+    backend = faulty_backend(delays=[0.0, 1.0])
+    client = OrderClient(backend, policies=make_policies(0.1))
+
+    async def run():
+        await client.check_order_details(12345, 67890)
+        return await client.cancel_order(12345, 67890)
+
+    result = asyncio.run(run())
+
+    assert result["cancelled"] is False
+    assert result["message"] == BACKEND_UNKNOWN_RESULT_MESSAGE
+    assert client.metrics.counts[("cancel_order", "timeout")] == 1
+
+
+def test_open_breaker_returns_fallback_without_calling_backend(faulty_backend):
+    backend = faulty_backend(failures=[True, True, True])
+    client = OrderClient(backend, breaker=CircuitBreaker(failure_threshold=3), policies=make_policies(0.5))
+
+    async def run():
+        results = []
+        for _ in range(4):
+            results.append(await client.cancel_order(12345, 67890))
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(result["message"] == BACKEND_FALLBACK_MESSAGE for result in results)
+    assert backend.calls == 3
+    assert client.metrics.counts[("cancel_order", "error")] == 3
+    assert client.metrics.counts[("cancel_order", "rejected")] == 1
+
+
+def test_multiple_orders_are_fetched_concurrently(faulty_backend):
+    backend = faulty_backend(delays=[0.3, 0.3, 0.3])
+    client = OrderClient(backend)
+
+    started = time.monotonic()
+    result = asyncio.run(client.check_multiple_orders(12345, [11111, 22222, 33333]))
+    elapsed = time.monotonic() - started
+
+    assert [order["order_id"] for order in result["orders"]] == [11111, 22222, 33333]
+    assert backend.calls == 3
+    # 3件を順に取得すると0.9秒かかるが、並行して取得するため一件分の時間で終わる
+    assert elapsed < 0.5
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, ResilienceMetrics, resilient_call
+
+
+def test_timeout_raises_and_records_metric(faulty_backend):
+    backend = faulty_backend(delays=[1.0])
+    metrics = ResilienceMetrics()
+
+    async def run():
+        await resilient_call("check_order_details", backend.get_order, 12345, 67890, timeout=0.05, metrics=metrics)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert metrics.counts[("check_order_details", "timeout")] == 1
+
+
+def test_hedged_request_wins_over_slow_first_request(faulty_backend):
+    backend = faulty_backend(delays=[1.0, 0.0])
+    metrics = ResilienceMetrics()
+
+    async def run():
+        return await resilient_call(
+            "check_order_details",
+            backend.get_order,
+            12345,
+            67890,
+            timeout=0.5,
+            hedge_delay=0.05,
+            metrics=metrics,
+        )
+
+    order = asyncio.run(run())
+    assert order["order_id"] == 67890
+    assert backend.calls == 2
+    assert metrics.counts[("check_order_details", "hedged_success")] == 1
+
+
+def test_original_request_winning_after_hedge_is_not_hedged_success(faulty_backend):
+    # ヘッジは送られるが、最初のリクエストの方が先に終わる
+    backend = faulty_backend(delays=[0.1, 1.0])
+    metrics = ResilienceMetrics()
+
+    async def run():
+        return await resilient_call(
+            "check_order_details",
+            backend.get_order,
+            12345,
+            67890,
+            timeout=0.5,
+            hedge_delay=0.05,
+            metrics=metrics,
+        )
+
+    asyncio.run(run())
+    assert backend.calls == 2
+    assert metrics.counts[("check_order_details", "success")] == 1
+    assert metrics.counts[("check_order_details", "hedged_success")] == 0
+
+
+def test_circuit_breaker_fails_fast_and_recovers(faulty_backend):
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=lambda: now[0])
+    backend = faulty_backend(failures=[True, True])
+    metrics = ResilienceMetrics()
+
+    async def call():
+        return await resilient_call(
+            "check_order_details",
+            backend.get_order,
+            12345,
+            67890,
+            timeout=0.5,
+            breaker=breaker,
+            metrics=metrics,
+        )
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            asyncio.run(call())
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # 遮断中はバックエンドを呼ばずに即座に失敗する
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call())
+    assert backend.calls == 2
+    assert metrics.counts[("check_order_details", "rejected")] == 1
+
+    # 遮断時間の経過後は試行が許可され、成功すれば復帰する
+    now[0] = 10.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    asyncio.run(call())
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert metrics.counts[("check_order_details", "success")] == 1
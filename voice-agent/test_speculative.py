@@ -0,0 +1,127 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from speculative import SpeculativeReplyGate
+
+# turn_detector.EOUModelのデフォルトのunlikely_threshold
+UNLIKELY_THRESHOLD = 0.0289
+
+
+class StubLLM:
+    """chatが呼ばれた時刻と入力を記録するテスト用のLLM"""
+
+    def __init__(self):
+        self.requests = []
+
+    def chat(self, chat_ctx, fnc_ctx):
+        self.requests.append((time.monotonic(), chat_ctx.messages[-1].content))
+        return "stream"
+
+
+def make_agent():
+    return SimpleNamespace(llm=StubLLM(), fnc_ctx=None)
+
+
+def make_chat_ctx(text):
+    return SimpleNamespace(messages=[SimpleNamespace(role="user", content=text)])
+
+
+def make_predict(probability):
+    async def predict(chat_ctx):
+        return probability
+    return predict
+
+
+def test_speculation_hit_when_committed_text_matches():
+    agent = make_agent()
+    gate = SpeculativeReplyGate(predict_eou=make_predict(0.3), unlikely_threshold=UNLIKELY_THRESHOLD, hold_delay=1.0)
+
+    started = time.monotonic()
+    stream = asyncio.run(gate.before_llm_cb(agent, make_chat_ctx("注文番号は12345です")))
+    gate.on_user_speech_committed("注文番号は12345です")
+
+    assert stream == "stream"
+    assert agent.llm.requests[0][0] - started < 0.1
+    assert gate.stats.snapshot()["hits"] == 1
+    assert gate.stats.hit_rate() == 1.0
+
+
+def test_low_probability_holds_llm_request():
+    agent = make_agent()
+    gate = SpeculativeReplyGate(predict_eou=make_predict(0.01), unlikely_threshold=UNLIKELY_THRESHOLD, hold_delay=0.2)
+
+    started = time.monotonic()
+    asyncio.run(gate.before_llm_cb(agent, make_chat_ctx("えっと")))
+
+    assert agent.llm.requests[0][0] - started >= 0.2
+    assert gate.stats.held == 1
+    assert gate.stats.started == 0
+
+
+def test_speculation_miss_counts_wasted_tokens():
+    agent = make_agent()
+    gate = SpeculativeReplyGate(predict_eou=make_predict(0.5), unlikely_threshold=UNLIKELY_THRESHOLD)
+    gate.on_llm_metrics(prompt_tokens=1000, completion_tokens=20)
+    # 破棄されたストリームはトークン数0のキャンセル済みメトリクスを送るが、推定には使わない
+    gate.on_llm_metrics(prompt_tokens=0, completion_tokens=0, cancelled=True)
+
+    async def run():
+        await gate.before_llm_cb(agent, make_chat_ctx("注文番号は"))
+        await gate.before_llm_cb(agent, make_chat_ctx("注文番号は 67890です"))
+
+    asyncio.run(run())
+    gate.on_user_speech_committed("注文番号は 67890です")
+
+    stats = gate.stats.snapshot()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["wasted_tokens"] == 1020
+
+
+def test_speculate_threshold_is_capped_at_unlikely_threshold():
+    gate = SpeculativeReplyGate(predict_eou=make_predict(0.5), unlikely_threshold=UNLIKELY_THRESHOLD)
+    assert gate.speculate_threshold == UNLIKELY_THRESHOLD
+
+    # パイプラインがmin_endpointing_delayで応答する確率では保留しない
+    gate = SpeculativeReplyGate(
+        predict_eou=make_predict(0.04), unlikely_threshold=UNLIKELY_THRESHOLD, speculate_threshold=0.05, hold_delay=1.0
+    )
+    assert gate.speculate_threshold == UNLIKELY_THRESHOLD
+    agent = make_agent()
+    asyncio.run(gate.before_llm_cb(agent, make_chat_ctx("はい")))
+    assert gate.stats.held == 0
+    assert gate.stats.started == 1
+
+
+def test_hold_is_measured_from_end_of_speech():
+    agent = make_agent()
+    gate = SpeculativeReplyGate(predict_eou=make_predict(0.0), unlikely_threshold=UNLIKELY_THRESHOLD, hold_delay=0.3)
+
+    async def run():
+        gate.on_user_stopped_speaking()
+        # 文字起こしの確定を待つ間に発話の終了から時間が経っている
+        await asyncio.sleep(0.2)
+        started = time.monotonic()
+        await gate.before_llm_cb(agent, make_chat_ctx("注文番号は123"))
+        return started
+
+    started = asyncio.run(run())
+    assert gate.stats.held == 1
+    assert agent.llm.requests[0][0] - started < 0.2
+
+
+def test_unresponsive_eou_inference_speculates_without_hold():
+    async def predict(chat_ctx):
+        raise asyncio.TimeoutError()
+
+    agent = make_agent()
+    gate = SpeculativeReplyGate(predict_eou=predict, unlikely_threshold=UNLIKELY_THRESHOLD, hold_delay=1.0)
+
+    started = time.monotonic()
+    stream = asyncio.run(gate.before_llm_cb(agent, make_chat_ctx("注文番号は12345です")))
+
+    assert stream == "stream"
+    assert agent.llm.requests[0][0] - started < 0.1
+    assert gate.stats.started == 1
+    assert gate.stats.held == 0
@@ -5,11 +5,11 @@ import uuid
 import logging
 import os
 from logging.handlers import RotatingFileHandler
-import random
 import datetime
 
 # api.pyからsave_conversation関数をインポート
 from api import save_conversation
+from order_client import OrderClient
 
 # ログディレクトリの設定
 log_dir = os.environ.get("LOG_DIR", "KMS/logs")
@@ -40,13 +40,13 @@ class AssistantFnc(llm.FunctionContext):
     音声アシスタントが実行できるLLM関数のセットを定義する。
     """
 
-    def __init__(self):
+    def __init__(self, backend=None):
         super().__init__()
-        # 注文データを保持するディクショナリ
-        self.orders = {}
+        # 注文バックエンドの呼び出し（タイムアウト・ヘッジ・サーキットブレーカー付き）
+        self.order_client = OrderClient(backend)
         # 実行された関数を追跡するためのリスト
         self.executed_functions = []
-        
+
     @llm.ai_callable(
         description="user_idとorder_idを引数に取り、注文のステータスを返します。user_idはともに5桁の数字です。",
     )
@@ -80,26 +80,42 @@ class AssistantFnc(llm.FunctionContext):
             # NOTE: add_to_chat_ctx=True は、Function Callingのチャットコンテキストの末尾にメッセージを追加する
             speech_handle = await agent.say(message, add_to_chat_ctx=True)  # noqa: F841
         
-        # 注文が存在するか確認
-        order_key = f"{user_id}_{order_id}"
-        if order_key not in self.orders:
-            # 注文が存在しない場合は新しく作成
-            order_status = random.choice(["準備中", "配送中"])
-            order_items = self.generate_random_order_items()
-            total_price = sum(item["price"] * item["quantity"] for item in order_items)
-            
-            # 注文情報を保存
-            self.orders[order_key] = {
-                "user_id": user_id,
-                "order_id": order_id,
-                "status": order_status,
-                "items": order_items,
-                "total_price": total_price,
-                "created_at": datetime.datetime.now().isoformat()
-            }
-        
-        # 注文情報を返す
-        return self.orders[order_key]
+        # 注文情報を取得して返す
+        return await self.order_client.check_order_details(user_id, order_id)
+
+    @llm.ai_callable(
+        description="user_idと複数のorder_idを引数に取り、それぞれの注文のステータスをまとめて返します。ユーザーが複数の注文について尋ねた場合に一度で確認するために使います。",
+    )
+    async def check_multiple_orders(
+        self,
+        user_id: int,
+        order_ids: list[int]
+    ):
+        """複数の注文のステータスをまとめて確認する"""
+
+        # 実行された関数を記録
+        self.executed_functions.append({
+            "function": "check_multiple_orders",
+            "args": {"user_id": user_id, "order_ids": order_ids},
+            "timestamp": datetime.datetime.now().isoformat()
+        })
+
+        # Function Calling実行中の状態通知
+        agent = AgentCallContext.get_current().agent
+
+        if (
+            not agent.chat_ctx.messages
+            or agent.chat_ctx.messages[-1].role != "assistant"
+        ):
+            # フィラーメッセージを発話
+            filler_message = "ユーザーID{user_id}の{count}件の注文のステータスを確認中です"
+            message = filler_message.format(user_id=user_id, count=len(order_ids))
+
+            # チャットコンテキストに追加
+            speech_handle = await agent.say(message, add_to_chat_ctx=True)  # noqa: F841
+
+        # 各注文を並行して取得し、一つの結果にまとめて返す
+        return await self.order_client.check_multiple_orders(user_id, order_ids)
 
     @llm.ai_callable(
         description="ユーザーの注文をキャンセルする"
@@ -132,54 +148,11 @@ class AssistantFnc(llm.FunctionContext):
             # チャットコンテキストに追加
             speech_handle = await agent.say(message, add_to_chat_ctx=True)  # noqa: F841
         
-        # 注文が存在するか確認
-        order_key = f"{user_id}_{order_id}"
-        if order_key not in self.orders:
-            return {
-                "order_id": order_id,
-                "user_id": user_id,
-                "cancelled": False,
-                "message": "注文が見つかりません"
-            }
-        
-        # 注文のステータスに基づいてキャンセル可能かを判断
-        order = self.orders[order_key]
-        if order["status"] == "準備中":
-            # 準備中ならキャンセル可能
-            order["status"] = "キャンセル済み"
-            return {
-                "order_id": order_id,
-                "user_id": user_id,
-                "cancelled": True,
-                "message": "注文が正常にキャンセルされました。返金は3-5営業日以内に処理されます"
-            }
-        elif order["status"] == "配送中":
-            # 配送中はキャンセル不可
-            return {
-                "order_id": order_id,
-                "user_id": user_id,
-                "cancelled": False,
-                "message": "この注文はすでに配送中のためキャンセルできません"
-            }
-        elif order["status"] == "配達完了":
-            # 配達完了はキャンセル不可
-            return {
-                "order_id": order_id,
-                "user_id": user_id,
-                "cancelled": False,
-                "message": "この注文はすでに配達済みのためキャンセルできません"
-            }
-        elif order["status"] == "キャンセル済み":
-            # すでにキャンセル済み
-            return {
-                "order_id": order_id,
-                "user_id": user_id,
-                "cancelled": False,
-                "message": "この注文はすでにキャンセル済みです"
-            }
+        # キャンセル処理を実行
+        return await self.order_client.cancel_order(user_id, order_id)
     
     @llm.ai_callable(
-        description="ユーザーの注文内容（商品の数量）を変更する.一つずつしか変更ができないので注意"
+        description="ユーザーの注文内容（商品の数量）を変更する。一つの商品のみ変更する場合に使い、複数の商品を変更する場合はupdate_order_quantitiesを使う"
     )
     async def update_order_quantity(
         self,
@@ -211,80 +184,52 @@ class AssistantFnc(llm.FunctionContext):
             # チャットコンテキストに追加
             speech_handle = await agent.say(message, add_to_chat_ctx=True)  # noqa: F841
         
-        # 注文が存在するか確認
-        order_key = f"{user_id}_{order_id}"
-        if order_key not in self.orders:
-            return {
-                "order_id": order_id,
-                "user_id": user_id,
-                "updated": False,
-                "message": "注文が見つかりません"
-            }
-        
-        # 注文のステータスに基づいて変更可能かを判断
-        order = self.orders[order_key]
-        
-        if order["status"] in ["配送中", "配達完了", "キャンセル済み"]:
-            return {
-                "order_id": order_id,
-                "user_id": user_id,
-                "updated": False,
-                "message": f"注文は現在「{order['status']}」状態のため変更できません"
-            }
-        
-        # 指定された商品が注文に存在するか確認
-        product_found = False
-        old_quantity = 0
-        old_total = order["total_price"]
-        
-        for item in order["items"]:
-            if item["name"] == product_name:
-                product_found = True
-                old_quantity = item["quantity"]
-                
-                # 合計金額の更新（古い数量分を引いて新しい数量分を足す）
-                price_diff = (new_quantity - old_quantity) * item["price"]
-                order["total_price"] += price_diff
-                
-                # 数量の更新
-                item["quantity"] = new_quantity
-                break
-        
-        if not product_found:
+        # 数量変更を実行
+        return await self.order_client.update_order_quantity(user_id, order_id, product_name, new_quantity)
+
+    @llm.ai_callable(
+        description="ユーザーの注文内容（複数の商品の数量）をまとめて変更する。product_namesとnew_quantitiesは同じ順番で対応させる。一つでも変更できない商品があれば、どの商品も変更しない"
+    )
+    async def update_order_quantities(
+        self,
+        user_id: int,
+        order_id: int,
+        product_names: list[str],
+        new_quantities: list[int]
+    ):
+        """注文内容の複数の商品数量をまとめて変更する"""
+
+        # 実行された関数を記録
+        self.executed_functions.append({
+            "function": "update_order_quantities",
+            "args": {"user_id": user_id, "order_id": order_id, "product_names": product_names, "new_quantities": new_quantities},
+            "timestamp": datetime.datetime.now().isoformat()
+        })
+
+        if len(product_names) != len(new_quantities):
             return {
                 "order_id": order_id,
                 "user_id": user_id,
                 "updated": False,
-                "message": f"注文に商品「{product_name}」が見つかりません"
-            }
-        
-        # 注文の更新日時を記録
-        order["updated_at"] = datetime.datetime.now().isoformat()
-        
-        # 商品の数量が0になった場合は注文から削除
-        if new_quantity == 0:
-            order["items"] = [item for item in order["items"] if item["name"] != product_name]
-            return {
-                "order_id": order_id,
-                "user_id": user_id,
-                "updated": True,
-                "message": f"商品「{product_name}」を注文から削除しました",
-                "old_quantity": old_quantity,
-                "new_quantity": new_quantity,
-                "old_total": old_total,
-                "new_total": order["total_price"]
+                "message": "商品名と数量の数が一致しません"
             }
-        
-        return {
-            "order_id": order_id,
-            "user_id": user_id,
-            "updated": True,
-            "message": f"商品「{product_name}」の数量を{old_quantity}個から{new_quantity}個に変更しました",
-            "old_quantity": old_quantity,
-            "new_quantity": new_quantity,
-            "old_total": old_total,
-            "new_total": order["total_price"]
-        }
+
+        # Function Calling実行中の状態通知
+        agent = AgentCallContext.get_current().agent
+
+        if (
+            not agent.chat_ctx.messages
+            or agent.chat_ctx.messages[-1].role != "assistant"
+        ):
+            # フィラーメッセージを発話
+            filler_message = "ユーザーID{user_id}の注文ID{order_id}の{count}件の商品の数量を変更しています"
+            message = filler_message.format(user_id=user_id, order_id=order_id, count=len(product_names))
+
+            # チャットコンテキストに追加
+            speech_handle = await agent.say(message, add_to_chat_ctx=True)  # noqa: F841
+
+        # 数量変更をまとめて実行
+        return await self.order_client.update_order_quantities(user_id, order_id, list(zip(product_names, new_quantities)))
 
     @llm.ai_callable(
         description="会話の終わりかけに選択する関数です。サービスの提供が終わりそうなタイミングに利用します。終了前に締めの挨拶を行います。"
@@ -334,6 +279,12 @@ class AssistantFnc(llm.FunctionContext):
                 if "args" in func and "order_id" in func["args"] and "user_id" in func["args"]:
                     order_id = str(func["args"]["order_id"])
                     user_id = str(func["args"]["user_id"])
+            elif func["function"] == "check_multiple_orders":
+                if "確認" not in action_types:
+                    action_types.append("確認")
+                # user_idを抽出（order_idは複数のため記録しない）
+                if "args" in func and "user_id" in func["args"]:
+                    user_id = str(func["args"]["user_id"])
             elif func["function"] == "cancel_order":
                 if "キャンセル" not in action_types:
                     action_types.append("キャンセル")
@@ -341,7 +292,7 @@ class AssistantFnc(llm.FunctionContext):
                 if "args" in func and "order_id" in func["args"] and "user_id" in func["args"]:
                     order_id = str(func["args"]["order_id"])
                     user_id = str(func["args"]["user_id"])
-            elif func["function"] == "update_order_quantity":
+            elif func["function"] in ["update_order_quantity", "update_order_quantities"]:
                 if "変更" not in action_types:
                     action_types.append("変更")
                 # order_idとuser_idを抽出
@@ -388,37 +339,3 @@ class AssistantFnc(llm.FunctionContext):
             logger.error(f"エージェント終了中にエラーが発生しました: {str(e)}")
         
         return {"status": "success", "message": "会話を終了しました"}
-
-    def generate_random_order_items(self, min_items=1, max_items=3):
-        """
-        ランダムなEC商品と個数のリストを生成する関数
-        """
-        # ECサイトの商品リスト（商品名と固定金額）
-        products = [
-            {"name": "ワイヤレスイヤホン", "price": 12800},
-            {"name": "スマートウォッチ", "price": 24500},
-            {"name": "ポータブル充電器", "price": 3980}
-        ]
-        
-        # ランダムに選ぶ商品数を決定
-        num_items = random.randint(min_items, max_items)
-        
-        # 重複なしで商品をランダムに選択
-        num_items = min(num_items, len(products))
-        selected_products = random.sample(products, num_items)
-        
-        # 各商品について数量を決定
-        order_items = []
-        for product in selected_products:
-            quantity = random.randint(1, 3)  # 1〜3個をランダムに選択
-            
-            order_items.append({
-                "name": product["name"],
-                "quantity": quantity,
-                "price": product["price"]
-            })
-        
-        return order_items
-
-
-